@@ -1,100 +1,121 @@
 # --- Step 1: Imports ---
 import os
-import io
+import json
 import pandas as pd
-import matplotlib.pyplot as plt
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from openai import OpenAI
 from dotenv import load_dotenv
+from gpt_cache import lookup_summaries, store_summaries
+from gpt_batch import run_batch
+from charts import render_chart
+from report import new_report_document, add_chart_section
 
 # --- Step 2: Load OpenAI API key ---
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_BATCH_SIZE = 5
+SUMMARY_PROMPT = (
+    "You are a road safety analyst. Write a short professional summary of each chart below.\n"
+    "Highlight notable patterns, especially frequencies, dominant values, or changes over time. "
+    "Use a tone similar to a traffic safety expert / consultant writing for a municipality.\n"
+    "Respond with a JSON object that maps each chart title to its summary.\n\n"
+)
+
+
+def build_summary_prompt(charts):
+    return SUMMARY_PROMPT + "\n\n".join(f"Title: {title}\nData: {data}" for title, data in charts)
+
 
 # --- Step 3: Load Excel file ---
 file_path = "AccidentDatabase.xlsx"  # 🔁 Replace with your file path
-df = pd.read_excel(file_path)
+excluded_cols = ['Latitude', 'Longitude', 'X-Coordinate', 'Y-Coordinate']
+df = pd.read_excel(file_path, engine='calamine', usecols=lambda c: c not in excluded_cols)
 print("✅ Excel file loaded successfully.")
 
 # --- Step 4: Identify useful categorical columns ---
-excluded_cols = ['Latitude', 'Longitude', 'X-Coordinate', 'Y-Coordinate']
-categorical_cols = [
-    col for col in df.columns
-    if df[col].dtype == 'object'
-    and col not in excluded_cols
-    and 2 <= df[col].nunique() <= 15
-]
+# One value_counts scan per column, reused both here and for the charts below
+text_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.difference(excluded_cols, sort=False)
+vc_cache = {col: df[col].value_counts() for col in text_cols}
+categorical_cols = [col for col, value_counts in vc_cache.items() if 2 <= len(value_counts) <= 15]
 print("📊 Selected columns for analysis:", categorical_cols)
 
 # --- Step 5: Create a new Word document ---
-doc = Document()
+doc = new_report_document()
 doc.add_heading("Collision Analysis Report", 0)
 doc.add_paragraph("Generated automatically by Mobility Edge Solutions")
-doc.add_page_break()
 
-figure_count = 1
+sections = []
+charts = {}
 
-# --- Step 6: Generate sections for each column ---
+# --- Step 6: Render a chart and collect the data to summarize for each column ---
 for col in categorical_cols:
     print(f"\n🧩 Processing column: {col}")
-    value_counts = df[col].value_counts()
+    value_counts = vc_cache[col]
 
     if len(value_counts) < 2:
         continue
 
     # --- Step 6.1: Create chart in memory ---
-    img_stream = io.BytesIO()
-    plt.figure(figsize=(6, 4))
-    if len(value_counts) <= 5:
-        plt.pie(value_counts, labels=value_counts.index, autopct='%1.1f%%')
-    else:
-        value_counts.plot(kind='bar')
-        plt.xticks(rotation=45, ha='right')
-    plt.title(col)
-    plt.tight_layout()
-    plt.savefig(img_stream, format='png')
-    plt.close()
-    img_stream.seek(0)
-
-    # --- Step 6.2: Generate GPT summary using your prompt ---
-    try:
-        title = col
-        data = value_counts.to_string()
-        prompt = (
-            f"You are a road safety analyst. Write a short professional summary of the chart titled '{title}'.\n\n"
-            f"Data: {data}\n\n"
-            f"Highlight notable patterns, especially frequencies, dominant values, or changes over time. "
-            f"Use a tone similar to a traffic safety expert / consultant writing for a municipality."
-        )
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=250
-        )
-        summary = response.choices[0].message.content.strip()
-    except Exception as e:
-        summary = f"[⚠️ GPT error: {e}]"
-        print(summary)
+    png = render_chart(col, value_counts, 'pie' if len(value_counts) <= 5 else 'bar')
+
+    sections.append((col, png))
+    charts[col] = value_counts.head(10).to_json(orient="index")
 
-    # --- Step 6.3: Insert into Word report ---
-    doc.add_heading(f"{figure_count}. {col}", level=1)
-    doc.add_picture(img_stream, width=Inches(5.5))
+# --- Step 7: Reuse cached summaries, batch-request the rest ---
+# Each chart is cached under its own single-chart prompt; misses are sent several charts per request.
+prompts = {col: build_summary_prompt([(col, data)]) for col, data in charts.items()}
+cached = lookup_summaries(SUMMARY_MODEL, prompts.values())
+summaries = {col: summary for col, summary in zip(prompts, cached) if summary is not None}
+pending = [col for col in charts if col not in summaries]
+print(f"\n♻️ {len(summaries)} summaries loaded from cache.")
 
-    caption = doc.add_paragraph(f"Figure {figure_count}: {col} Distribution")
-    caption.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-    caption.runs[0].italic = True
+if pending:
+    groups = {
+        f"group-{i}": pending[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(pending), SUMMARY_BATCH_SIZE)
+    }
+    print(f"🤖 Requesting {len(pending)} summaries in {len(groups)} requests through the Batch API...")
+    try:
+        replies, errors = run_batch(client, {
+            group_id: {
+                "model": SUMMARY_MODEL,
+                "messages": [{"role": "user", "content": build_summary_prompt([(col, charts[col]) for col in cols])}],
+                "response_format": {"type": "json_object"},
+                "max_tokens": 300 * len(cols)
+            }
+            for group_id, cols in groups.items()
+        })
+    except Exception as e:
+        replies, errors = {}, {group_id: e for group_id in groups}
+    for group_id, error in errors.items():
+        replies[group_id] = f"[⚠️ GPT error: {error}]"
+        print(replies[group_id])
 
-    paragraph = doc.add_paragraph(summary)
-    paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-    paragraph.runs[0].font.size = Pt(11)
+    fetched = {}
+    for group_id, cols in groups.items():
+        reply = replies[group_id]
+        try:
+            group_summaries = json.loads(reply)
+        except ValueError:
+            group_summaries = {}
+        for col in cols:
+            if col in group_summaries:
+                fetched[col] = str(group_summaries[col]).strip()
+            elif reply.startswith("[⚠️ GPT error"):
+                fetched[col] = reply
+            else:
+                fetched[col] = f"[⚠️ GPT error: no summary returned for '{col}']"
+    summaries.update(fetched)
+    store_summaries(SUMMARY_MODEL, {
+        prompts[col]: summary for col, summary in fetched.items() if not summary.startswith("[⚠️ GPT error")
+    })
 
-    doc.add_page_break()
+# --- Step 8: Insert sections into Word report ---
+figure_count = 1
+for col, png in sections:
+    add_chart_section(doc, f"{figure_count}. {col}", png, f"Figure {figure_count}: {col} Distribution", summaries[col])
     figure_count += 1
 
-# --- Step 7: Save the report ---
+# --- Step 9: Save the report ---
 output_file = "collision_report.docx"
 doc.save(output_file)
 print(f"\n✅ Report saved successfully as '{output_file}'")
@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.patches import FancyArrow
+from matplotlib.lines import Line2D
+from pyproj import Transformer
+import contextily as ctx
+
+# Keep downloaded basemap tiles between runs instead of contextily's per-session temp dir
+ctx.set_cache_dir(".tile_cache")
+
+MAP_COLUMNS = ["Latitude", "Longitude", "Classification Of Accident"]
+COLOR_LIST = ['#FF0000', '#00CC00', '#0000FF', '#FFA500', '#800080', '#00FFFF', '#FFC0CB', '#FFFF00', '#00CED1', '#FF1493']
+
+
+def render_map(df, dpi=150):
+    # df: the MAP_COLUMNS of the report data; returns the street map as PNG bytes.
+    # Top-level so it can run in a worker process while the rest of the report is built.
+    # Still categorical here, so this lowercases each category once rather than every row
+    classification = df["Classification Of Accident"].map(str.lower)
+    unique_types = classification.unique()
+    auto_color_map = {stype: COLOR_LIST[i % len(COLOR_LIST)] for i, stype in enumerate(unique_types)}
+
+    # Project straight to Web Mercator on the coordinate arrays, no per-row Point objects
+    xs, ys = Transformer.from_crs(4326, 3857, always_xy=True).transform(
+        df["Longitude"].to_numpy(dtype=float), df["Latitude"].to_numpy(dtype=float)
+    )
+
+    fig, ax = plt.subplots(figsize=(14, 12))
+    # One scatter artist for every point; the legend is built from the color map instead
+    ax.scatter(
+        xs,
+        ys,
+        c=classification.map(auto_color_map).to_numpy(),
+        s=100,
+        edgecolors='none'
+    )
+    legend_handles = [
+        Line2D([0], [0], marker='o', linestyle='none', markerfacecolor=color, markeredgecolor='none', markersize=10, label=acc_type.title())
+        for acc_type, color in auto_color_map.items()
+    ]
+
+    buffer = 500
+    minx, miny, maxx, maxy = np.nanmin(xs), np.nanmin(ys), np.nanmax(xs), np.nanmax(ys)
+    ax.set_xlim(minx - buffer, maxx + buffer)
+    ax.set_ylim(miny - buffer, maxy + buffer)
+    ctx.add_basemap(ax, source=ctx.providers.OpenStreetMap.Mapnik, zoom=17)
+
+    ax.text(0.95, 0.95, 'N', transform=ax.transAxes, fontsize=20, fontweight='bold', ha='center', va='center', color='black')
+    arrow = FancyArrow(0.95, 0.91, 0, 0.03, transform=ax.transAxes, width=0.01, head_width=0.03, head_length=0.02, length_includes_head=True, color='black', edgecolor='white')
+    ax.add_patch(arrow)
+
+    ax.set_title("Accident Locations by Type", fontsize=16)
+    ax.axis("off")
+    ax.legend(handles=legend_handles, title="Accident Type", fontsize=10, title_fontsize=11, loc="lower left")
+
+    fig.tight_layout()
+    map_stream = io.BytesIO()
+    fig.savefig(map_stream, format="png", dpi=dpi)
+    plt.close(fig)
+    return map_stream.getvalue()
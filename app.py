@@ -1,18 +1,14 @@
 import os
 import io
+import json
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from openai import OpenAI
-from datetime import datetime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from gpt_cache import lookup_summaries, store_summaries
+from gpt_batch import run_batch
 from PIL import Image
-import geopandas as gpd
-from shapely.geometry import Point
-import contextily as ctx
-from matplotlib.patches import FancyArrow
 
 st.set_page_config(
     page_title="Collisio – Collision Report Generator",
@@ -38,19 +34,285 @@ with open("collision_template.xlsx", "rb") as f:
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+# gpt-4o-mini writes these short chart summaries at a fraction of gpt-4o's cost and latency
+SUMMARY_MODELS = ["gpt-4o-mini", "gpt-4o"]
+SUMMARY_BATCH_SIZE = 8
+SUMMARY_PROMPT = (
+    "You are a road safety analyst. Write a short professional summary "
+    "of each accident chart below.\n"
+    "Highlight the most common types and any interesting patterns.\n"
+    "Respond with a JSON object that maps each chart title to its summary.\n\n"
+)
+
+GROUPED_SECTIONS = [
+    ("Accident Year", "Accidents by Year"),
+    ("Accident Day", "Accidents by Day"),
+    ("Light", "Light Condition Distribution"),
+    ("Environment Condition 1", "Environment Condition 1 Distribution"),
+    ("Environment Condition 2", "Environment Condition 2 Distribution"),
+    ("Initial Impact Type", "Initial Impact Type Analysis"),
+    ("Impact Location", "Impact Location Analysis"),
+    ("Apparent Driver 1 Action", "Driver 1 Action Trends"),
+    ("Apparent Driver 2 Action", "Driver 2 Action Trends"),
+    ("Driver 1 Condition", "Driver 1 Condition Trends"),
+    ("Driver 2 Condition", "Driver 2 Condition Trends"),
+]
+
+REPORT_COLUMNS = {
+    'Classification Of Accident', 'Accident Date', 'Accident Time', 'Latitude', 'Longitude',
+    *(column for column, _ in GROUPED_SECTIONS)
+}
+TEXT_COLUMNS = [
+    'Classification Of Accident', 'Accident Time', 'Light',
+    'Environment Condition 1', 'Environment Condition 2', 'Initial Impact Type', 'Impact Location',
+    'Apparent Driver 1 Action', 'Apparent Driver 2 Action', 'Driver 1 Condition', 'Driver 2 Condition',
+]
+
+
+@st.cache_data(show_spinner=False)
+def load_report_data(file_bytes):
+    df = pd.read_excel(
+        io.BytesIO(file_bytes),
+        engine='calamine',
+        usecols=lambda c: c in REPORT_COLUMNS,
+        dtype={c: str for c in TEXT_COLUMNS}
+    )
+    df.dropna(how='all', inplace=True)
+    df = df.dropna(subset=['Classification Of Accident'])
+    text_cols = df.select_dtypes(include=['object', 'string']).columns
+    blank = np.zeros(len(df), dtype=bool)
+    for col in text_cols:
+        # Clean each distinct value once and broadcast it back through the factorized codes
+        codes, uniques = pd.factorize(df[col])
+        if len(uniques):
+            cleaned = np.array([x.strip().replace("**", "") if isinstance(x, str) else x for x in uniques], dtype=object)
+            # Blank cells are found through the same codes, testing each distinct value once;
+            # the trailing False is looked up by the missing-value code -1
+            is_blank = np.array([isinstance(x, str) and x in ('', ' ') for x in cleaned] + [False])
+            blank |= is_blank[codes]
+            df[col] = np.where(codes >= 0, cleaned[codes], df[col])
+        # factorize codes None and NaN alike; only None counts as blank, as it did with isin(['', ' ', None])
+        missing = codes < 0
+        if missing.any():
+            blank[missing] |= np.equal(df[col].to_numpy()[missing], None)
+    df = df[~blank]
+    category_cols = [c for c in ['Classification Of Accident', *(c for c, _ in GROUPED_SECTIONS)] if c in df.columns]
+    df[category_cols] = df[category_cols].astype('category')
+    return df
+
+
+def count_by_classification(df, column_name):
+    # Both columns are categorical, so one bincount over their paired codes builds the table;
+    # dropping all-zero rows/columns gives the same result as groupby(observed=True).size().unstack()
+    keys, classes = df[column_name], df['Classification Of Accident']
+    key_codes, class_codes = keys.cat.codes.to_numpy(), classes.cat.codes.to_numpy()
+    observed = (key_codes >= 0) & (class_codes >= 0)
+    n_classes = len(classes.cat.categories)
+    counts = np.bincount(
+        key_codes[observed].astype(np.int64) * n_classes + class_codes[observed],
+        minlength=len(keys.cat.categories) * n_classes
+    )
+    table = pd.DataFrame(
+        counts.reshape(len(keys.cat.categories), n_classes),
+        index=pd.CategoricalIndex(keys.cat.categories, dtype=keys.dtype, name=column_name),
+        columns=pd.CategoricalIndex(classes.cat.categories, dtype=classes.dtype, name='Classification Of Accident')
+    )
+    return table.loc[table.any(axis=1), table.any(axis=0)]
+
+
+# Cached on the cleaned frame, so re-uploading the same workbook skips every groupby
+@st.cache_data(show_spinner=False)
+def build_aggregates(df):
+    aggregates = {}
+
+    if 'Classification Of Accident' in df.columns:
+        aggregates["Accident Severity Distribution"] = (df['Classification Of Accident'].value_counts(), "pie")
+
+        for column_name, title in GROUPED_SECTIONS:
+            if column_name in df.columns:
+                grouped = count_by_classification(df, column_name)
+                aggregates[title] = (grouped, "bar")
+
+    if 'Accident Date' in df.columns:
+        try:
+            dates = pd.to_datetime(df['Accident Date'], errors='coerce')
+            weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+            month_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+            # Build the categoricals straight from the numeric weekday/month codes (-1 for missing dates)
+            dow = dates.dt.dayofweek.fillna(-1).astype(int).to_numpy()
+            month = dates.dt.month.fillna(0).astype(int).to_numpy()
+            df = df.assign(**{
+                'Accident Date': dates,
+                'Day of Week': pd.Categorical.from_codes(dow, categories=weekday_order),
+                'Day Type': pd.Categorical.from_codes(np.where(dow < 0, -1, dow >= 5), categories=['Weekday', 'Weekend']),
+                'Accident Month': pd.Categorical.from_codes(month - 1, categories=month_order),
+            })
+
+            weekday_grouped = count_by_classification(df, 'Day of Week').reindex(weekday_order)
+            aggregates["Accident Type by Day of Week"] = (weekday_grouped, "bar")
+
+            daytype_grouped = count_by_classification(df, 'Day Type')
+            aggregates["Accident Type by Weekday vs Weekend"] = (daytype_grouped, "bar")
+
+            month_grouped = count_by_classification(df, 'Accident Month').reindex(month_order)
+            aggregates["Accident Type by Month"] = (month_grouped, "bar")
+        except Exception as e:
+            st.warning(f"Could not process date-based charts: {e}")
+
+    if 'Accident Time' in df.columns:
+        try:
+            time_strings = df['Accident Time'].astype(str).str.lower().str.replace(r'[ap]m', '', regex=True).str.strip()
+            hours = pd.to_datetime(time_strings, format='%H:%M:%S', errors='coerce').dt.hour
+            period_order = ['Morning', 'Afternoon', 'Evening', 'Night']
+            # Hours [0, 6), [6, 12), [12, 17), [17, 21), [21, 24) -> Night, Morning, Afternoon, Evening, Night
+            period_codes = np.array([3, 0, 1, 2, 3])[np.searchsorted([6, 12, 17, 21], hours.to_numpy(), side='right')]
+            period_codes[hours.isna().to_numpy()] = -1
+            time_period = pd.Categorical.from_codes(period_codes, categories=period_order)
+            time_grouped = count_by_classification(df.assign(**{'Time Period': time_period}), 'Time Period').reindex(period_order)
+            aggregates["Accident Type by Time of Day"] = (time_grouped, "bar")
+        except Exception as e:
+            st.warning(f"Could not process time of day: {e}")
+
+    return aggregates
+
+
+def prompt_rows(chart_data, limit=10):
+    # Keep the busiest rows, in chart order, so month/weekday tables are not cut off by position
+    totals = chart_data.sum(axis=1) if isinstance(chart_data, pd.DataFrame) else chart_data
+    return chart_data[(totals.rank(method="first", ascending=False) <= limit).to_numpy()]
+
+
+def build_summary_prompt(charts):
+    return SUMMARY_PROMPT + "\n\n".join(f"Title: {title}\nData: {data}" for title, data in charts)
+
+
+@lru_cache(maxsize=128)
+def clean_title(title):
+    return title.replace("**", "").replace("#", "").strip()
+
+
+@st.cache_resource
+def get_client():
+    from openai import OpenAI
+    return OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+
+
+def summary_request(batch, model):
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": build_summary_prompt(batch)}],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 300 * len(batch)
+    }
+
+
+def parse_summaries(batch, content):
+    summaries = json.loads(content)
+    return [
+        str(summaries.get(title, f"[GPT Error: no summary returned for '{title}']")).strip()
+        for title, _ in batch
+    ]
+
+
+async def fetch_summaries(charts, model, max_concurrency=10, attempts=3):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    batches = [charts[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(charts), SUMMARY_BATCH_SIZE)]
+
+    # One HTTP/2 connection carries all concurrent requests, so the TLS handshake is paid once
+    http_client = DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    )
+    # Retries are handled below, only for 429s, 5xx and dropped connections
+    async with AsyncOpenAI(api_key=st.secrets["OPENAI_API_KEY"], max_retries=0, http_client=http_client) as aclient:
+        async def summarize(batch):
+            async with semaphore:
+                for attempt in range(attempts):
+                    try:
+                        response = await aclient.chat.completions.create(**summary_request(batch, model))
+                        return parse_summaries(batch, response.choices[0].message.content)
+                    except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                        if attempt == attempts - 1:
+                            return [f"[GPT Error: {e}]"] * len(batch)
+                        await asyncio.sleep(2 ** attempt)
+                    except Exception as e:
+                        return [f"[GPT Error: {e}]"] * len(batch)
+
+        results = await asyncio.gather(*(summarize(b) for b in batches))
+    return [summary for batch in results for summary in batch]
+
+
+def fetch_summaries_batch(charts, model, poll_interval=15):
+    # Batch API: half the price of real-time requests, but results can take minutes
+    batches = [charts[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(charts), SUMMARY_BATCH_SIZE)]
+    batch_status = st.empty()
+    try:
+        replies, errors = run_batch(
+            get_client(),
+            {f"batch-{i}": summary_request(batch, model) for i, batch in enumerate(batches)},
+            poll_interval=poll_interval,
+            on_status=batch_status.caption
+        )
+    except Exception as e:
+        return [f"[GPT Error: {e}]"] * len(charts)
+    finally:
+        batch_status.empty()
+
+    summaries = []
+    for i, batch in enumerate(batches):
+        custom_id = f"batch-{i}"
+        try:
+            if custom_id not in replies:
+                raise RuntimeError(errors[custom_id])
+            summaries.extend(parse_summaries(batch, replies[custom_id]))
+        except Exception as e:
+            summaries.extend([f"[GPT Error: {e}]"] * len(batch))
+    return summaries
+
+
+def summarize_charts(charts, model, use_batch=False):
+    prompts = [build_summary_prompt([chart]) for chart in charts]
+    summaries = lookup_summaries(model, prompts)
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    if missing:
+        pending = [charts[i] for i in missing]
+        fetched = fetch_summaries_batch(pending, model) if use_batch else asyncio.run(fetch_summaries(pending, model))
+        for i, summary in zip(missing, fetched):
+            summaries[i] = summary
+        store_summaries(model, {
+            prompts[i]: summaries[i] for i in missing if not summaries[i].startswith("[GPT Error")
+        })
+    return summaries
 
 # Initialize session state
 if "report_ready" not in st.session_state:
     st.session_state["report_ready"] = False
-if "report_path" not in st.session_state:
-    st.session_state["report_path"] = None
-if "map_path" not in st.session_state:
-    st.session_state["map_path"] = None
-
+if "report_docx" not in st.session_state:
+    st.session_state["report_docx"] = None
+if "map_png" not in st.session_state:
+    st.session_state["map_png"] = None
+
+summary_model = st.sidebar.selectbox("🧠 Summary model", SUMMARY_MODELS, key="model")
+summary_mode = st.radio(
+    "🤖 AI summaries",
+    ["Fast (real-time)", "Cheap (Batch API, can take several minutes)"],
+    horizontal=True
+)
+# A 14x12 in map at 600 dpi is ~60 Mpx; 150 dpi is plenty on screen and in print previews
+high_res_map = st.checkbox("🗺️ High-resolution map (600 dpi, much slower)")
 uploaded_file = st.file_uploader("📂 Upload Excel File", type=["xlsx"])
 
 if uploaded_file and not st.session_state["report_ready"]:
+    # Heavy imports wait for an upload, so the landing page renders without them
+    import numpy as np
+    import pandas as pd
+    import httpx
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, APIConnectionError, RateLimitError, InternalServerError
+    from charts import render_charts
+    from report import new_report_document, add_chart_section
+    from accident_map import MAP_COLUMNS, render_map
+
     section_title = st.empty()
     section_placeholder = st.empty()
     progress_bar = st.progress(0)
@@ -67,193 +329,71 @@ if uploaded_file and not st.session_state["report_ready"]:
         progress_bar.progress(min(processed_count / total_sections, 1.0))
 
     with st.spinner("Generating report. Please wait..."):
-        df = pd.read_excel(uploaded_file)
-        df.dropna(how='all', inplace=True)
-        df = df.dropna(subset=['Classification Of Accident'])
-        df = df.applymap(lambda x: x.strip().replace("**", "") if isinstance(x, str) else x)
-        df = df[~df.isin(['', ' ', None]).any(axis=1)]
+        df = load_report_data(uploaded_file.getvalue())
         st.success("File read successfully.")
 
-        doc = Document()
+        doc = new_report_document()
         doc.add_heading("Collision Analysis Report", 0)
         doc.add_paragraph("Prepared by Mobility Edge Solution").alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-        doc.add_page_break()
-
-        section_count = 1
-
-        def add_section(title, chart_data, chart_type="bar"):
-            global section_count
-            if chart_data.empty:
-                return
 
+        # The street map (tile download and rasterization) is independent of the sections,
+        # so it renders in its own process for the whole time the report is being built
+        map_pool = ProcessPoolExecutor(max_workers=1)
+        map_future = None
+        if all(col in df.columns for col in MAP_COLUMNS):
+            map_future = map_pool.submit(render_map, df[MAP_COLUMNS], dpi=600 if high_res_map else 150)
+
+        chart_jobs = [
+            (title, chart_data, "pie" if chart_type == "pie" and len(chart_data) <= 6 else "bar")
+            for title, (chart_data, chart_type) in build_aggregates(df).items()
+            if not chart_data.empty
+        ]
+        # Start the chart workers first, then request summaries (they only need the chart data)
+        # on a thread while the charts and the map render
+        chart_pngs = render_charts(chart_jobs, ylabel="Number of Accidents")
+        summary_pool = ThreadPoolExecutor(max_workers=1, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()))
+        summaries_future = summary_pool.submit(
+            summarize_charts,
+            [(title, prompt_rows(chart_data).to_json(orient="index")) for title, chart_data, _ in chart_jobs],
+            summary_model,
+            use_batch=summary_mode.startswith("Cheap")
+        )
+
+        sections = []
+        for (title, _, _), png in zip(chart_jobs, chart_pngs):
             show_section(title)
-
-            img_stream = io.BytesIO()
-            plt.figure(figsize=(6, 4))
-            if chart_type == "pie" and len(chart_data) <= 6:
-                plt.pie(chart_data, labels=chart_data.index, autopct='%1.1f%%')
-            else:
-                ax = chart_data.plot(kind="bar", stacked=isinstance(chart_data, pd.DataFrame))
-                plt.xticks(rotation=45, ha='right')
-                ax.set_ylabel("Number of Accidents")
-            plt.title(title)
-            plt.tight_layout()
-            plt.savefig(img_stream, format="png")
-            plt.close()
-            img_stream.seek(0)
-
-            prompt = (
-                f"You are a road safety analyst. Write a short professional summary "
-                f"of this accident chart titled '{title}'.\n\n"
-                f"Data: {chart_data.head(10).to_string()}\n\n"
-                f"Highlight the most common types and any interesting patterns."
-            )
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=300
-                )
-                summary = response.choices[0].message.content.strip()
-            except Exception as e:
-                summary = f"[GPT Error: {e}]"
-
-            clean_title = title.replace("**", "").replace("###", "").strip().replace("#", "").strip()
-            doc.add_heading(f"Section {section_count}: {clean_title}", level=1)
-            doc.add_picture(img_stream, width=Inches(5.5))
-            caption = doc.add_paragraph(f"Figure {section_count}: {clean_title}")
-            caption.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            caption.runs[0].italic = True
-            clean_summary = summary.replace("**", "").strip()
-            para = doc.add_paragraph(clean_summary)
-            para.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-            para.runs[0].font.size = Pt(11)
-            doc.add_page_break()
-            section_count += 1
-
-        def add_grouped_section(column_name, title):
-            if column_name in df.columns and 'Classification Of Accident' in df.columns:
-                grouped = df.groupby([column_name, 'Classification Of Accident']).size().unstack(fill_value=0)
-                if not grouped.empty:
-                    add_section(title, grouped, chart_type="bar")
-
-        if 'Classification Of Accident' in df.columns:
-            add_section("Accident Severity Distribution", df['Classification Of Accident'].value_counts(), chart_type="pie")
-
-        add_grouped_section("Accident Year", "Accidents by Year")
-        add_grouped_section("Accident Day", "Accidents by Day")
-        add_grouped_section("Light", "Light Condition Distribution")
-        add_grouped_section("Environment Condition 1", "Environment Condition 1 Distribution")
-        add_grouped_section("Environment Condition 2", "Environment Condition 2 Distribution")
-        add_grouped_section("Initial Impact Type", "Initial Impact Type Analysis")
-        add_grouped_section("Impact Location", "Impact Location Analysis")
-        add_grouped_section("Apparent Driver 1 Action", "Driver 1 Action Trends")
-        add_grouped_section("Apparent Driver 2 Action", "Driver 2 Action Trends")
-        add_grouped_section("Driver 1 Condition", "Driver 1 Condition Trends")
-        add_grouped_section("Driver 2 Condition", "Driver 2 Condition Trends")
-
-        if 'Accident Date' in df.columns:
-            try:
-                df['Accident Date'] = pd.to_datetime(df['Accident Date'], errors='coerce')
-                df['Day of Week'] = df['Accident Date'].dt.day_name()
-                weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                weekday_grouped = df.groupby(['Day of Week', 'Classification Of Accident']).size().unstack(fill_value=0).reindex(weekday_order)
-                add_section("Accident Type by Day of Week", weekday_grouped)
-
-                df['Day Type'] = df['Accident Date'].dt.dayofweek.apply(lambda x: 'Weekend' if x >= 5 else 'Weekday')
-                daytype_grouped = df.groupby(['Day Type', 'Classification Of Accident']).size().unstack(fill_value=0)
-                add_section("Accident Type by Weekday vs Weekend", daytype_grouped)
-
-                df['Accident Month'] = df['Accident Date'].dt.month_name()
-                month_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-                month_grouped = df.groupby(['Accident Month', 'Classification Of Accident']).size().unstack(fill_value=0).reindex(month_order)
-                add_section("Accident Type by Month", month_grouped)
-            except Exception as e:
-                st.warning(f"Could not process date-based charts: {e}")
-
-        if 'Accident Time' in df.columns:
-            try:
-                def clean_time_string(t):
-                    if pd.isnull(t): return None
-                    t = str(t).lower().strip().replace('pm', '').replace('am', '')
-                    try:
-                        dt = datetime.strptime(t.strip(), '%H:%M:%S')
-                    except:
-                        try:
-                            dt = datetime.strptime(t.strip(), '%I:%M:%S')
-                        except:
-                            return None
-                    return dt.strftime('%H:%M')
-
-                df['Cleaned Time'] = df['Accident Time'].apply(clean_time_string)
-
-                def classify_period(t):
-                    try:
-                        if t is None:
-                            return 'Unknown'
-                        hour = int(t.split(':')[0])
-                        if 6 <= hour < 12: return 'Morning'
-                        elif 12 <= hour < 17: return 'Afternoon'
-                        elif 17 <= hour < 21: return 'Evening'
-                        else: return 'Night'
-                    except:
-                        return 'Unknown'
-
-                df['Time Period'] = df['Cleaned Time'].apply(classify_period)
-                period_order = ['Morning', 'Afternoon', 'Evening', 'Night']
-                df_filtered = df[df['Time Period'].isin(period_order)]
-                time_grouped = df_filtered.groupby(['Time Period', 'Classification Of Accident']).size().unstack(fill_value=0).reindex(period_order)
-                add_section("Accident Type by Time of Day", time_grouped)
-            except Exception as e:
-                st.warning(f"Could not process time of day: {e}")
+            sections.append((title, png))
 
         try:
-            if 'Latitude' in df.columns and 'Longitude' in df.columns and 'Classification Of Accident' in df.columns:
-                df["Classification Of Accident"] = df["Classification Of Accident"].astype(str).str.strip().str.lower()
-                color_list = ['#FF0000', '#00CC00', '#0000FF', '#FFA500', '#800080', '#00FFFF', '#FFC0CB', '#FFFF00', '#00CED1', '#FF1493']
-                unique_types = df["Classification Of Accident"].unique()
-                auto_color_map = {stype: color_list[i % len(color_list)] for i, stype in enumerate(unique_types)}
-
-                geometry = [Point(xy) for xy in zip(df["Longitude"], df["Latitude"])]
-                gdf = gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326").to_crs(epsg=3857)
-
-                fig, ax = plt.subplots(figsize=(14, 12))
-                for acc_type in unique_types:
-                    subset = gdf[gdf["Classification Of Accident"] == acc_type]
-                    color = auto_color_map[acc_type]
-                    label = acc_type.title()
-                    subset.plot(ax=ax, label=label, color=color, markersize=100, edgecolor='none')
-
-                buffer = 500
-                minx, miny, maxx, maxy = gdf.total_bounds
-                ax.set_xlim(minx - buffer, maxx + buffer)
-                ax.set_ylim(miny - buffer, maxy + buffer)
-                ctx.add_basemap(ax, source=ctx.providers.OpenStreetMap.Mapnik, zoom=17)
-
-                ax.text(0.95, 0.95, 'N', transform=ax.transAxes, fontsize=20, fontweight='bold', ha='center', va='center', color='black')
-                arrow = FancyArrow(0.95, 0.91, 0, 0.03, transform=ax.transAxes, width=0.01, head_width=0.03, head_length=0.02, length_includes_head=True, color='black', edgecolor='white')
-                ax.add_patch(arrow)
-
-                ax.set_title("Accident Locations by Type", fontsize=16)
-                ax.axis("off")
-                ax.legend(title="Accident Type", fontsize=10, title_fontsize=11, loc="lower left")
-
-                plt.tight_layout()
-                map_path = "accident_map.png"
-                plt.savefig(map_path, dpi=600)
-                plt.close()
-                st.session_state["map_path"] = map_path
+            if map_future is not None:
+                st.session_state["map_png"] = map_future.result()
         except Exception as e:
             st.warning(f"Could not generate street map: {e}")
+        map_pool.shutdown()
+
+        section_placeholder.markdown(f"<small>🤖 Writing summaries for <strong>{len(sections)}</strong> sections</small>", unsafe_allow_html=True)
+        summaries = summaries_future.result()
+        summary_pool.shutdown()
+
+        section_count = 1
+        for (title, png), summary in zip(sections, summaries):
+            heading = clean_title(title)
+            add_chart_section(
+                doc,
+                f"Section {section_count}: {heading}",
+                png,
+                f"Figure {section_count}: {heading}",
+                summary.replace("**", "").strip()
+            )
+            section_count += 1
 
         doc.add_heading(f"Section {section_count}: Collision Type Diagrams", level=1)
         doc.add_paragraph("[Custom collision type diagrams will be rendered based on type and geometry data in future versions.]")
-        doc.add_page_break()
 
-        output_path = "collision_report.docx"
-        doc.save(output_path)
+        report_stream = io.BytesIO()
+        doc.save(report_stream)
 
-        st.session_state["report_path"] = output_path
+        st.session_state["report_docx"] = report_stream.getvalue()
         st.session_state["report_ready"] = True
 
         section_title.empty()
@@ -262,12 +402,15 @@ if uploaded_file and not st.session_state["report_ready"]:
 
 if st.session_state["report_ready"]:
     st.success("✅ Report is ready!")
-    with open(st.session_state["report_path"], "rb") as f:
-        st.download_button("🧾 Download Report", f, file_name="collision_report.docx")
+    st.download_button(
+        "🧾 Download Report",
+        st.session_state["report_docx"],
+        file_name="collision_report.docx",
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
 
-    if st.session_state["map_path"]:
-        with open(st.session_state["map_path"], "rb") as img_file:
-            st.markdown("**🗺️ Download Accident Map**")
-            st.download_button("🗺️ Download Map (PNG)", img_file.read(), file_name="accident_map.png", mime="image/png")
+    if st.session_state["map_png"]:
+        st.markdown("**🗺️ Download Accident Map**")
+        st.download_button("🗺️ Download Map (PNG)", st.session_state["map_png"], file_name="accident_map.png", mime="image/png")
 else:
     st.info("Please upload an Excel file to begin.")
@@ -0,0 +1,53 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+from PIL import Image
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+# One figure and one PNG buffer per process, reused for every chart it renders.
+_fig = _ax = None
+_stream = io.BytesIO()
+
+
+def render_chart(title, chart_data, chart_type="bar", ylabel=None):
+    global _fig, _ax
+    if _fig is None:
+        _fig, _ax = plt.subplots(figsize=(6, 4), dpi=72)
+
+    # clear() keeps the equal aspect and hidden frame a pie leaves behind
+    _ax.clear()
+    _ax.set(aspect="auto", frame_on=True)
+    if chart_type == "pie":
+        _ax.pie(chart_data, labels=chart_data.index, autopct='%1.1f%%')
+    else:
+        chart_data.plot(kind="bar", stacked=isinstance(chart_data, pd.DataFrame), ax=_ax)
+        plt.setp(_ax.get_xticklabels(), rotation=45, ha='right')
+        if ylabel:
+            _ax.set_ylabel(ylabel)
+    _ax.set_title(title)
+    _fig.tight_layout()
+
+    # Charts use a handful of flat colors, so a 64-color palette PNG is ~3x smaller than RGBA;
+    # quantize straight from the canvas buffer instead of encoding and re-reading a PNG
+    _fig.canvas.draw()
+    image = Image.frombuffer("RGBA", _fig.canvas.get_width_height(), _fig.canvas.buffer_rgba())
+    _stream.seek(0)
+    _stream.truncate()
+    image.convert("RGB").quantize(colors=64).save(_stream, format="PNG")
+    return _stream.getvalue()
+
+
+def render_charts(jobs, ylabel=None):
+    # jobs: (title, chart_data, chart_type) tuples; returns an iterator of PNG bytes in the same order.
+    # Every job is submitted (and the workers started) before this returns, so callers can overlap other work.
+    if not jobs:
+        return iter(())
+    executor = ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1))
+    pngs = executor.map(partial(render_chart, ylabel=ylabel), *zip(*jobs))
+    executor.shutdown(wait=False)
+    return pngs
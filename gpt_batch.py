@@ -0,0 +1,44 @@
+import io
+import json
+import time
+
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def run_batch(client, requests, poll_interval=30, on_status=print):
+    # requests: {custom_id: chat completion body}; returns ({custom_id: reply}, {custom_id: error})
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+        for custom_id, body in requests.items()
+    ]
+    batch_input = io.BytesIO("\n".join(lines).encode("utf-8"))
+    batch_file = client.files.create(file=("summaries.jsonl", batch_input), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    on_status(f"⏳ Submitted batch {batch.id} with {len(lines)} requests.")
+
+    # Small batches often finish within a minute, so poll early and back off to poll_interval
+    delay = min(2, poll_interval)
+    while batch.status not in FINAL_STATUSES:
+        time.sleep(delay)
+        delay = min(delay * 2, poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        on_status(f"   Batch status: {batch.status}")
+
+    replies, errors = {}, {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") == 200:
+                replies[result["custom_id"]] = response["body"]["choices"][0]["message"]["content"].strip()
+            else:
+                errors[result["custom_id"]] = str(result.get("error") or response.get("body"))
+
+    for custom_id in requests:
+        if custom_id not in replies and custom_id not in errors:
+            errors[custom_id] = f"batch {batch.status}"
+    return replies, errors
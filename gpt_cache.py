@@ -0,0 +1,33 @@
+import hashlib
+import sqlite3
+from contextlib import closing
+
+CACHE_PATH = "gpt_cache.sqlite"
+
+
+def _connect():
+    conn = sqlite3.connect(CACHE_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, summary TEXT)")
+    return conn
+
+
+def cache_key(model, prompt):
+    return hashlib.sha256((model + prompt).encode("utf-8")).hexdigest()
+
+
+def lookup_summaries(model, prompts):
+    with closing(_connect()) as conn:
+        summaries = []
+        for prompt in prompts:
+            row = conn.execute("SELECT summary FROM cache WHERE key = ?", (cache_key(model, prompt),)).fetchone()
+            summaries.append(row[0] if row else None)
+    return summaries
+
+
+def store_summaries(model, summaries):
+    with closing(_connect()) as conn:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, summary) VALUES (?, ?)",
+                [(cache_key(model, prompt), summary) for prompt, summary in summaries.items()]
+            )
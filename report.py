@@ -0,0 +1,28 @@
+import io
+
+from docx import Document
+from docx.shared import Inches, Pt
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.style import WD_STYLE_TYPE
+
+
+def new_report_document():
+    doc = Document()
+    caption_style = doc.styles.add_style("Figure Caption", WD_STYLE_TYPE.PARAGRAPH)
+    caption_style.base_style = doc.styles["Normal"]
+    caption_style.font.italic = True
+    caption_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    summary_style = doc.styles.add_style("Section Summary", WD_STYLE_TYPE.PARAGRAPH)
+    summary_style.base_style = doc.styles["Normal"]
+    summary_style.font.size = Pt(11)
+    summary_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+    # Every section starts on a new page through its heading style, not a page-break paragraph
+    doc.styles["Heading 1"].paragraph_format.page_break_before = True
+    return doc
+
+
+def add_chart_section(doc, heading, png, caption, summary):
+    doc.add_heading(heading, level=1)
+    doc.add_picture(io.BytesIO(png), width=Inches(5.5))
+    doc.add_paragraph(caption, style="Figure Caption")
+    doc.add_paragraph(summary, style="Section Summary")